@@ -2,25 +2,37 @@
 # Weekly ingest: Instagram (Apify), X (Apify), Reddit (RSS), News (RSS), Google Trends (Apify) → big JSON
 # Outputs:
 #   data/raw/*.jsonl per source
-#   data/all_YYYY-MM-DD.json combined
+#   data/all_YYYY-MM-DD.ndjson combined
 
 import os
-import subprocess
+import re
+import html
+import json
+import codecs
+import shutil
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
 
 import yaml
 import feedparser
+import httpx
 import orjson
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from tqdm import tqdm
 
 load_dotenv()
 APIFY_TOKEN = os.getenv("APIFY_TOKEN")
+APIFY_CACHE = os.getenv("APIFY_CACHE", "1") != "0"  # set to 0 to always hit Apify
 
 ROOT = Path(__file__).resolve().parents[1]
 RAW = ROOT / "data" / "raw"
 RAW.mkdir(parents=True, exist_ok=True)
+CACHE_ROOT = ROOT / "data" / "cache"
 CONFIG_DIR_ENV = os.getenv("CONFIG_DIR", "")
 if CONFIG_DIR_ENV:
     config_dir_candidate = Path(CONFIG_DIR_ENV)
@@ -30,6 +42,64 @@ else:
     config_dir_candidate = ROOT / "config"
 CONFIG_DIR = config_dir_candidate
 
+# Shared HTTP session so Reddit calls reuse pooled keep-alive connections
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) RedditRSSFetcher/1.0"
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=0))
+SESSION.headers.update({"User-Agent": USER_AGENT})
+# Apify calls all go to api.apify.com: one thread-safe HTTP/2 client lets the worker
+# threads multiplex their requests over a single connection
+APIFY_CLIENT = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=300,
+)
+MAX_WORKERS = 8  # concurrent actor / feed fetches
+
+
+# ---------- feedparser encoding patch ----------
+# feedparser decodes the whole payload while sniffing its encoding (falling back to
+# chardet on failure). Sniff from a prefix instead and convert the remainder once.
+FEED_SNIFF_BYTES = 2 ** 15
+_feedparser_convert_to_utf8 = feedparser.api.convert_to_utf8
+
+
+# Codecs (by codecs.lookup name) where '<' always stands for itself, so decoding can resume
+# there: UTF-8 and stateless single-byte charsets. Multibyte (Shift_JIS, GBK, UTF-16) and
+# stateful 7-bit codecs (ISO-2022-*, HZ, UTF-7, where '<' occurs inside shifted runs) are not.
+SPLITTABLE_ENCODINGS = ("utf-8", "ascii", "iso8859-", "cp125", "koi8-", "mac-")
+
+
+def _splittable_encoding(encoding: str) -> bool:
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    return name.startswith(SPLITTABLE_ENCODINGS)
+
+
+def _convert_prefix_to_utf8(http_headers, data, result):
+    # cut just before a '<'; only trusted below for SPLITTABLE_ENCODINGS, where it can't be
+    # part of a multibyte sequence (it can in Shift_JIS/GBK and inside ISO-2022 shifted runs)
+    cut = data.find(b"<", FEED_SNIFF_BYTES)
+    if cut == -1:
+        return _feedparser_convert_to_utf8(http_headers, data, result)
+    prefix_result = {}
+    prefix = _feedparser_convert_to_utf8(http_headers, data[:cut], prefix_result)
+    encoding = prefix_result.get("encoding") or ""
+    # anything doubtful about the prefix (e.g. an encoding override) gets the full sniff
+    if prefix_result.get("bozo") or not _splittable_encoding(encoding):
+        return _feedparser_convert_to_utf8(http_headers, data, result)
+    try:
+        rest = data[cut:].decode(encoding).encode("utf-8")
+    except (UnicodeDecodeError, LookupError):
+        return _feedparser_convert_to_utf8(http_headers, data, result)
+    result.update(prefix_result)
+    return prefix + rest
+
+
+feedparser.api.convert_to_utf8 = _convert_prefix_to_utf8
+
 
 # ---------- helpers ----------
 
@@ -44,9 +114,61 @@ def since_days(days: int) -> str:
 
 def save_jsonl(path: Path, rows):
     path.parent.mkdir(parents=True, exist_ok=True)
+    # Serialise into one buffer and issue a single write
+    data = b"".join(orjson.dumps(r, option=orjson.OPT_APPEND_NEWLINE) for r in rows)
     with open(path, "wb") as f:
-        for r in rows:
-            f.write(orjson.dumps(r) + b"\n")
+        f.write(data)
+
+
+def cache_path(namespace: str, key: dict) -> Path:
+    """Per-day cache file for `key` under data/cache/<namespace>/."""
+    cache_dir = CACHE_ROOT / namespace
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # stdlib json for the key so existing cache file names stay stable
+    blob = json.dumps({"d": date_stamp(), **key}, sort_keys=True)
+    h = hashlib.sha1(blob.encode("utf-8")).hexdigest()
+    return cache_dir / f"{h}.json"
+
+
+def load_cache(cp: Path):
+    if cp.exists():
+        try:
+            return orjson.loads(cp.read_bytes())
+        except Exception:
+            return None
+
+
+def save_cache(cp: Path, data):
+    try:
+        cp.write_bytes(orjson.dumps(data))
+    except Exception:
+        pass
+
+
+def cached_today(namespace: str):
+    """Memoise a function's JSON-able result on disk for the rest of the UTC day."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cp = cache_path(namespace, {"fn": fn.__name__, "args": list(args), "kwargs": kwargs})
+            cached = load_cache(cp)
+            if cached is not None:
+                return cached
+            out = fn(*args, **kwargs)
+            if out:  # don't pin an empty (possibly throttled) result for the whole day
+                save_cache(cp, out)
+            return out
+        return wrapper
+    return decorator
+
+
+# tags, plus whole script/style blocks since sanitisation is off
+_TAG_RE = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+
+
+def strip_html(s) -> str:
+    """Flatten an (unsanitised) feed summary to plain text."""
+    return html.unescape(_TAG_RE.sub(" ", s or ""))
 
 
 def load_config_yaml(name: str):
@@ -58,15 +180,24 @@ def load_config_yaml(name: str):
 
 
 def apify_run(actor_id: str, input_payload: dict):
+    """
+    Run an Apify actor and return dataset items, reusing today's cached result for
+    the same (actor_id, input_payload) unless APIFY_CACHE=0.
+    """
+    if APIFY_CACHE:
+        return _apify_run_cached(actor_id, input_payload)
+    return _apify_run(actor_id, input_payload)
+
+
+def _apify_run(actor_id: str, input_payload: dict):
     """
     Run an Apify actor synchronously and return dataset items.
     Accept any 2xx status; handle JSON array or NDJSON.
     """
-    import requests
     if not APIFY_TOKEN:
         raise RuntimeError("APIFY_TOKEN is not set in .env")
     url = f"https://api.apify.com/v2/acts/{actor_id}/run-sync-get-dataset-items?token={APIFY_TOKEN}"
-    r = requests.post(url, json=input_payload, timeout=300)
+    r = APIFY_CLIENT.post(url, json=input_payload)
     if not (200 <= r.status_code < 300):
         raise RuntimeError(f"Apify error {r.status_code}: {r.text}")
     try:
@@ -80,63 +211,82 @@ def apify_run(actor_id: str, input_payload: dict):
         return [orjson.loads(line) for line in txt.splitlines() if line.strip()]
 
 
+_apify_run_cached = cached_today("apify")(_apify_run)
+
+
 # ---------- sources ----------
 
+def _fetch_ig_creator(u):
+    """Fetch recent posts for one Instagram creator (errors are logged, not raised)."""
+    try:
+        items = apify_run("apify~instagram-scraper", {
+            "directUrls": [f"https://www.instagram.com/{u}"],
+            "resultsType": "posts",
+            "resultsLimit": 30,
+            "onlyPostsNewerThan": "14 days",
+            "addParentData": False
+        })
+        return [{
+            "platform": "instagram",
+            "kind": "post",
+            "author": u,
+            "url": it.get("url") or it.get("postUrl"),
+            "ts": it.get("timestamp") or it.get("takenAt"),
+            "text": it.get("caption"),
+            "likes": it.get("likesCount"),
+            "comments": it.get("commentsCount"),
+            "shares": None,
+            "hashtags": it.get("hashtags"),
+        } for it in items]
+    except Exception as e:
+        print(f"[WARN] IG creator {u}: {e}")
+        return []
+
+
+def _fetch_ig_hashtag(h):
+    """Fetch recent posts for one Instagram hashtag (errors are logged, not raised)."""
+    try:
+        items = apify_run("apify~instagram-hashtag-scraper", {
+            "hashtags": [h],
+            "resultsLimit": 50
+        })
+        return [{
+            "platform": "instagram",
+            "kind": "hashtag",
+            "tag": h,
+            "url": it.get("url"),
+            "ts": it.get("firstCommentAt") or it.get("timestamp"),
+            "text": it.get("caption"),
+            "likes": it.get("likesCount"),
+            "comments": it.get("commentsCount"),
+            "shares": None,
+            "hashtags": it.get("hashtags"),
+        } for it in items]
+    except Exception as e:
+        print(f"[WARN] IG hashtag #{h}: {e}")
+        return []
+
+
 def ingest_instagram(creators, hashtags):
     """
     Instagram creators via apify/instagram-scraper (posts),
     hashtags via apify/instagram-hashtag-scraper.
+    Actor calls are independent, so they run concurrently on a thread pool.
     """
     outrows = []
 
-    # Creators → posts
-    for u in tqdm(creators, desc="IG creators"):
-        try:
-            items = apify_run("apify~instagram-scraper", {
-                "directUrls": [f"https://www.instagram.com/{u}"],
-                "resultsType": "posts",
-                "resultsLimit": 30,
-                "onlyPostsNewerThan": "14 days",
-                "addParentData": False
-            })
-            for it in items:
-                outrows.append({
-                    "platform": "instagram",
-                    "kind": "post",
-                    "author": u,
-                    "url": it.get("url") or it.get("postUrl"),
-                    "ts": it.get("timestamp") or it.get("takenAt"),
-                    "text": it.get("caption"),
-                    "likes": it.get("likesCount"),
-                    "comments": it.get("commentsCount"),
-                    "shares": None,
-                    "hashtags": it.get("hashtags"),
-                })
-        except Exception as e:
-            print(f"[WARN] IG creator {u}: {e}")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        # Submit everything up front; results come back in input order
+        creator_rows = ex.map(_fetch_ig_creator, creators)
+        hashtag_rows = ex.map(_fetch_ig_hashtag, hashtags)
 
-    # Hashtags → posts
-    for h in tqdm(hashtags, desc="IG hashtags"):
-        try:
-            items = apify_run("apify~instagram-hashtag-scraper", {
-                "hashtags": [h],
-                "resultsLimit": 50
-            })
-            for it in items:
-                outrows.append({
-                    "platform": "instagram",
-                    "kind": "hashtag",
-                    "tag": h,
-                    "url": it.get("url"),
-                    "ts": it.get("firstCommentAt") or it.get("timestamp"),
-                    "text": it.get("caption"),
-                    "likes": it.get("likesCount"),
-                    "comments": it.get("commentsCount"),
-                    "shares": None,
-                    "hashtags": it.get("hashtags"),
-                })
-        except Exception as e:
-            print(f"[WARN] IG hashtag #{h}: {e}")
+        # Creators → posts
+        for rows in tqdm(creator_rows, total=len(creators), desc="IG creators"):
+            outrows.extend(rows)
+
+        # Hashtags → posts
+        for rows in tqdm(hashtag_rows, total=len(hashtags), desc="IG hashtags"):
+            outrows.extend(rows)
 
     save_jsonl(RAW / f"instagram_{date_stamp()}.jsonl", outrows)
 
@@ -170,17 +320,16 @@ def ingest_x(search_terms, tweet_language="en", days_back=7, max_items=150, sort
                     return default
             return cur
 
-        for it in items:
-            rows.append({
-                "platform": "x",
-                "url": it.get("url") or it.get("twitterUrl"),
-                "author": g(it, "author.screen_name") or g(it, "author.name"),
-                "ts": it.get("created_at") or it.get("date") or it.get("timeParsed"),
-                "text": it.get("full_text") or "",
-                "likes": it.get("favorite_count", 0),
-                "comments": it.get("reply_count", 0),
-                "shares": it.get("retweet_count", 0),
-            })
+        rows = [{
+            "platform": "x",
+            "url": it.get("url") or it.get("twitterUrl"),
+            "author": g(it, "author.screen_name") or g(it, "author.name"),
+            "ts": it.get("created_at") or it.get("date") or it.get("timeParsed"),
+            "text": it.get("full_text") or "",
+            "likes": it.get("favorite_count", 0),
+            "comments": it.get("reply_count", 0),
+            "shares": it.get("retweet_count", 0),
+        } for it in items]
     except Exception as e:
         print(f"[WARN] X ingest (Apify) failed: {e}")
 
@@ -188,33 +337,38 @@ def ingest_x(search_terms, tweet_language="en", days_back=7, max_items=150, sort
 
 
 
+def _fetch_reddit_sub(s):
+    """Fetch the 'new' RSS feed for one subreddit (errors are logged, not raised)."""
+    try:
+        url = f"https://www.reddit.com/r/{s}/new/.rss?limit=50"
+        r = SESSION.get(url, timeout=20)
+        r.raise_for_status()
+        # sanitising/URI-resolving summaries is wasted work: strip_html flattens them anyway
+        feed = feedparser.parse(r.content, sanitize_html=False, resolve_relative_uris=False)
+        return [{
+            "platform": "reddit",
+            "subreddit": s,
+            "url": e.link,
+            "ts": e.get("published"),
+            "title": e.get("title"),
+            "text": strip_html(e.get("summary", "")),
+            "likes": None,
+            "comments": None,
+            "shares": None,
+        } for e in feed.entries]
+    except Exception as e:
+        print(f"[WARN] Reddit r/{s}: {e}")
+        return []
+
+
 def ingest_reddit(subs):
     """
-    Reddit via 'new' RSS feeds (no auth), using a browser-like User-Agent.
+    Reddit via 'new' RSS feeds (no auth), using the session's browser-like User-Agent.
     """
-    import requests
     rows = []
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) RedditRSSFetcher/1.0"}
-    for s in tqdm(subs, desc="Reddit RSS"):
-        try:
-            url = f"https://www.reddit.com/r/{s}/new/.rss?limit=50"
-            r = requests.get(url, headers=headers, timeout=20)
-            r.raise_for_status()
-            feed = feedparser.parse(r.content)
-            for e in feed.entries:
-                rows.append({
-                    "platform": "reddit",
-                    "subreddit": s,
-                    "url": e.link,
-                    "ts": e.get("published"),
-                    "title": e.get("title"),
-                    "text": e.get("summary", ""),
-                    "likes": None,
-                    "comments": None,
-                    "shares": None,
-                })
-        except Exception as e:
-            print(f"[WARN] Reddit r/{s}: {e}")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        for sub_rows in tqdm(ex.map(_fetch_reddit_sub, subs), total=len(subs), desc="Reddit RSS"):
+            rows.extend(sub_rows)
     save_jsonl(RAW / f"reddit_{date_stamp()}.jsonl", rows)
 
 
@@ -222,19 +376,18 @@ def ingest_news(rss_list):
     rows = []
     for url in tqdm(rss_list, desc="News RSS"):
         try:
-            feed = feedparser.parse(url)
-            for e in feed.entries:
-                rows.append({
-                    "platform": "news",
-                    "source": url,
-                    "url": e.get("link"),
-                    "ts": e.get("published", ""),
-                    "title": e.get("title"),
-                    "text": e.get("summary") or e.get("description") or "",
-                    "likes": None,
-                    "comments": None,
-                    "shares": None,
-                })
+            feed = feedparser.parse(url, sanitize_html=False, resolve_relative_uris=False)
+            rows.extend({
+                "platform": "news",
+                "source": url,
+                "url": e.get("link"),
+                "ts": e.get("published", ""),
+                "title": e.get("title"),
+                "text": strip_html(e.get("summary") or e.get("description")),
+                "likes": None,
+                "comments": None,
+                "shares": None,
+            } for e in feed.entries)
         except Exception as e:
             print(f"[WARN] News {url}: {e}")
     save_jsonl(RAW / f"news_{date_stamp()}.jsonl", rows)
@@ -247,17 +400,14 @@ def ingest_trends(terms, geo="US", time_range="now 7-d"):
       - jittered exponential backoff on 429/5xx
       - per-day disk cache to avoid repeat calls
       - optional proxy via HTTP(S)_PROXY env vars
+      - up to 3 groups in flight, paced by a shared ~1 req/s token bucket
     Writes: data/raw/trends_YYYY-MM-DD.jsonl
     """
-    import os, hashlib, json, time, random
+    import os, time, random, threading
     from pathlib import Path
     from pytrends.request import TrendReq
     from requests.exceptions import HTTPError
 
-    # cache dir (per-day, per-geo, per-time_range, per-term-group)
-    CACHE = (ROOT / "data" / "cache" / "trends")
-    CACHE.mkdir(parents=True, exist_ok=True)
-
     def chunks(lst, n):
         for i in range(0, len(lst), n):
             yield lst[i:i+n]
@@ -272,46 +422,40 @@ def ingest_trends(terms, geo="US", time_range="now 7-d"):
             if "https" in k.lower():
                 proxies["https"] = v
 
-    pytrends = TrendReq(
-        hl='en-US', tz=0,
-        requests_args={
-            "headers": {"User-Agent": "Mozilla/5.0"},
-            **({"proxies": proxies} if proxies else {})
-        },
-        retries=0,             # we’ll implement our own backoff
-        backoff_factor=0.0
-    )
-
-    rows = []
-
-    # helper to read/write cache
-    def cache_path(group):
-        key = json.dumps({
-            "d": date_stamp(),
-            "geo": geo,
-            "range": time_range,
-            "terms": group
-        }, sort_keys=True)
-        h = hashlib.sha1(key.encode("utf-8")).hexdigest()
-        return CACHE / f"{h}.json"
-
-    def load_cache(cp):
-        if cp.exists():
+    # TrendReq keeps per-instance payload state, so each worker thread gets its own
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "pytrends"):
+            local.pytrends = TrendReq(
+                hl='en-US', tz=0,
+                requests_args={
+                    "headers": {"User-Agent": "Mozilla/5.0"},
+                    **({"proxies": proxies} if proxies else {})
+                },
+                retries=0,             # we’ll implement our own backoff
+                backoff_factor=0.0
+            )
+        return local.pytrends
+
+    # token bucket: starts full, refilled with one permit per ~second (jittered)
+    workers = 3
+    bucket = threading.BoundedSemaphore(workers)
+    stop_refill = threading.Event()
+
+    def refill():
+        while not stop_refill.wait(1.0 + random.uniform(0, 0.75)):
             try:
-                return json.loads(cp.read_text(encoding="utf-8"))
-            except Exception:
-                return None
+                bucket.release()
+            except ValueError:
+                pass  # bucket already full
 
-    def save_cache(cp, data):
-        try:
-            cp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-        except Exception:
-            pass
+    rows = []
 
     # jittered backoff runner
     def build_and_fetch(group):
-        # try cache first
-        cp = cache_path(group)
+        # try cache first (per-day, per-geo, per-time_range, per-term-group)
+        cp = cache_path("trends", {"geo": geo, "range": time_range, "terms": group})
         cached = load_cache(cp)
         if cached is not None:
             return cached
@@ -319,6 +463,8 @@ def ingest_trends(terms, geo="US", time_range="now 7-d"):
         attempt = 0
         while True:
             try:
+                bucket.acquire()
+                pytrends = client()
                 pytrends.build_payload(group, timeframe=time_range, geo=geo)
                 df = pytrends.interest_over_time()
                 # normalise to records
@@ -350,12 +496,15 @@ def ingest_trends(terms, geo="US", time_range="now 7-d"):
                     return [{"term": t, "ts": None, "value": None, "error": str(ex)} for t in group]
                 time.sleep(2 + random.uniform(0, 1.5))
 
-    # process in groups of 5 with small inter-group pause
-    for group in tqdm(list(chunks(terms, 5)), desc="Google Trends"):
-        out = build_and_fetch(group)
-        rows.extend([{"platform": "trends", **rec} for rec in out])
-        # polite spacing between groups
-        time.sleep(1.0 + random.uniform(0, 0.75))
+    # process in groups of 5; the bucket provides the polite spacing between requests
+    groups = list(chunks(terms, 5))
+    threading.Thread(target=refill, daemon=True).start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for out in tqdm(pool.map(build_and_fetch, groups), total=len(groups), desc="Google Trends"):
+                rows.extend([{"platform": "trends", **rec} for rec in out])
+    finally:
+        stop_refill.set()
 
     save_jsonl(RAW / f"trends_{date_stamp()}.jsonl", rows)
 
@@ -369,61 +518,48 @@ if __name__ == "__main__":
     hashtags_cfg = load_config_yaml("hashtags.yaml")
     sources_cfg = load_config_yaml("sources.yaml")
 
-    # Instagram
+    # Sources hit different hosts and don't share state, so run them side by side:
+    # wall time becomes the slowest source rather than the sum of all of them.
     ig_creators = creators_cfg.get("instagram", [])
     ig_hashtags = hashtags_cfg.get("instagram", [])
-    try:
-        ingest_instagram(ig_creators, ig_hashtags)
-    except Exception as e:
-        print(f"[WARN] Instagram ingest failed: {e}")
-
-    # X via Apify
     x_cfg = sources_cfg.get("x", {})
-    try:
-        ingest_x(
+    tasks = {
+        # Instagram
+        "Instagram": lambda: ingest_instagram(ig_creators, ig_hashtags),
+        # X via Apify
+        "X": lambda: ingest_x(
             x_cfg.get("search_terms", []),
             tweet_language=x_cfg.get("tweet_language", "en"),
             days_back=int(x_cfg.get("days_back", 7)),
             max_items=int(x_cfg.get("max_items", 150)),
             sort=x_cfg.get("sort", "Latest"),
-        )
-    except Exception as e:
-        print(f"[WARN] X ingest failed: {e}")
-
-    # Reddit
-    try:
-        ingest_reddit(sources_cfg.get("reddit", {}).get("subreddits", []))
-    except Exception as e:
-        print(f"[WARN] Reddit ingest failed: {e}")
-
-    # News RSS
-    try:
-        ingest_news(sources_cfg.get("news_rss", []))
-    except Exception as e:
-        print(f"[WARN] News ingest failed: {e}")
-
-    # Google Trends via Apify (US)
-    try:
-        ingest_trends(
+        ),
+        # Reddit
+        "Reddit": lambda: ingest_reddit(sources_cfg.get("reddit", {}).get("subreddits", [])),
+        # News RSS
+        "News": lambda: ingest_news(sources_cfg.get("news_rss", [])),
+        # Google Trends (US)
+        "Trends": lambda: ingest_trends(
             sources_cfg.get("trends_terms", []),
             geo=sources_cfg.get("trends_geo", "US"),
             time_range=sources_cfg.get("trends_time_range", "now 7-d"),
-        )
-    except Exception as e:
-        print(f"[WARN] Trends ingest failed: {e}")
-
-    # Combine today's files (UTC date)
-    combined = []
-    for p in sorted(RAW.glob(f"*_{date_stamp()}.jsonl")):
-        with open(p, "rb") as f:
-            for line in f:
-                try:
-                    combined.append(orjson.loads(line))
-                except Exception:
-                    pass
-
-    out_path = ROOT / "data" / f"all_{date_stamp()}.json"
-    with open(out_path, "wb") as f:
-        f.write(orjson.dumps(combined, option=orjson.OPT_INDENT_2))
-
-    print(f"Wrote {out_path} with {len(combined)} items.")
+        ),
+    }
+    with ThreadPoolExecutor(max_workers=len(tasks)) as ex:
+        futures = {name: ex.submit(fn) for name, fn in tasks.items()}
+        for name, fut in futures.items():
+            try:
+                fut.result()
+            except Exception as e:
+                print(f"[WARN] {name} ingest failed: {e}")
+
+    # Combine today's files (UTC date). Each source is already NDJSON, so the combined
+    # file is a plain byte-for-byte concatenation with no parsing at all.
+    out_path = ROOT / "data" / f"all_{date_stamp()}.ndjson"
+    sources = sorted(RAW.glob(f"*_{date_stamp()}.jsonl"))
+    with open(out_path, "wb") as out:
+        for p in sources:
+            with open(p, "rb") as src:
+                shutil.copyfileobj(src, out, length=1 << 20)
+
+    print(f"Wrote {out_path} from {len(sources)} source files.")
@@ -1,7 +1,9 @@
 # scripts/02_prepare_context.py
 # Create balanced, deduped, LLM-ready context covering all platforms
 
-import orjson, re, hashlib, statistics, math
+import orjson, re, heapq
+import numpy as np
+import xxhash
 from pathlib import Path
 from collections import Counter, defaultdict
 
@@ -10,38 +12,61 @@ DATA = ROOT / "data"
 OUTDIR = DATA / "context"
 OUTDIR.mkdir(parents=True, exist_ok=True)
 
+_STRIP = re.compile(r"http\S+|[@#]\w+|\d+")
+_TOK = re.compile(r"[a-z][a-z'\-]+")
+STOP = frozenset("the a an and or for with this that about from into over under your our their you we they of in on at to is are be was were been being will would can could should it its it's im i'm".split())
+
 def latest_all_json():
-    files = sorted(DATA.glob("all_*.json"))
+    # all_YYYY-MM-DD.ndjson from 01_ingest.py; older runs wrote a .json array
+    # same date in both formats: the .ndjson is the fresh one, so it sorts last
+    files = sorted(
+        [*DATA.glob("all_*.ndjson"), *DATA.glob("all_*.json")],
+        key=lambda p: (p.stem, p.suffix == ".ndjson"),
+    )
     if not files:
-        raise FileNotFoundError("No data/all_YYYY-MM-DD.json found. Run 01_ingest.py first.")
+        raise FileNotFoundError("No data/all_YYYY-MM-DD.ndjson found. Run 01_ingest.py first.")
     return files[-1]
 
 def load_all():
-    return orjson.loads(open(latest_all_json(), "rb").read())
+    """Yield raw rows from the latest combined file."""
+    path = latest_all_json()
+    if path.suffix == ".json":
+        yield from orjson.loads(path.read_bytes())
+        return
+    with open(path, "rb") as f:
+        yield from (orjson.loads(line) for line in f if line.strip())
 
 def norm_text(t):
-    return re.sub(r"\s+", " ", (t or "")).strip()
+    # str.split() splits on exactly the characters re's \s matches, in C, and drops the ends
+    return " ".join((t or "").split())
 
 def hash_text(t):
-    return hashlib.md5(norm_text(t).encode("utf-8")).hexdigest()
+    # 64-bit non-cryptographic digest of already-normalised text
+    return xxhash.xxh3_64_intdigest(t.encode("utf-8"))
+
+def text_key(t):
+    """Dedup key for normalised text: short strings are their own key, long ones are hashed."""
+    return t if len(t) < 256 else hash_text(t)
 
 def prepare(rows):
-    """Deduplicate and normalise text/fields"""
-    seen = set()
-    cleaned = []
+    """Deduplicate and normalise text/fields (accepts any iterable, yields cleaned rows)"""
+    seen: set[int | str] = set()
     for r in rows:
         url = r.get("url")
-        key = url or hash_text(r.get("text") or r.get("title") or "")
+        # normalise once; the results feed both the dedup key and the cleaned row
+        title = norm_text(r.get("title"))
+        text = norm_text(r.get("text") or r.get("caption"))
+        key = url or text_key(text or title)
         if key in seen:
             continue
         seen.add(key)
-        cleaned.append({
+        yield {
             "platform": (r.get("platform") or "").lower(),
             "ts": r.get("ts"),
             "author": r.get("author") or r.get("subreddit") or "",
             "url": url,
-            "title": norm_text(r.get("title") or ""),
-            "text": norm_text(r.get("text") or r.get("caption") or ""),
+            "title": title,
+            "text": text,
             "likes": r.get("likes"),
             "comments": r.get("comments"),
             "shares": r.get("shares"),
@@ -49,8 +74,7 @@ def prepare(rows):
             "tag": r.get("tag"),
             "term": r.get("term"),
             "value": r.get("value"),
-        })
-    return cleaned
+        }
 
 def safe_nonneg_int(x):
     try:
@@ -62,67 +86,73 @@ def safe_nonneg_int(x):
 
 def trend_score(rows):
     """Compute engagement z-score across entire dataset"""
-    bases = []
-    for r in rows:
-        likes = safe_nonneg_int(r.get("likes"))
-        comments = safe_nonneg_int(r.get("comments"))
-        shares = safe_nonneg_int(r.get("shares"))
-        base = likes + 2 * comments + 2 * shares
-        s = math.log1p(max(0, base))
-        bases.append(s)
-    mu = statistics.fmean(bases) if bases else 0.0
-    sd = statistics.pstdev(bases) if len(bases) > 1 else 0.0
-    out = []
-    for r, s in zip(rows, bases):
-        z = (s - mu) / (sd if sd > 0 else 1.0)
-        r["score"] = round(z, 3)
-        out.append(r)
-    return out
+    if not rows:
+        return rows
+    base = np.fromiter(
+        (safe_nonneg_int(r.get("likes"))
+         + 2 * safe_nonneg_int(r.get("comments"))
+         + 2 * safe_nonneg_int(r.get("shares")) for r in rows),
+        dtype=np.int64,
+        count=len(rows),
+    )
+    s = np.log1p(base)
+    sd = s.std()
+    z = (s - s.mean()) / (sd if sd > 0 else 1.0)
+    for r, zi in zip(rows, z.tolist()):
+        r["score"] = round(zi, 3)
+    return rows
 
 def ngram_slang(rows, min_len=3, top_k=50):
     """Collect frequent n-grams from social-style posts"""
-    texts = [(r.get("text") or "") for r in rows if r.get("platform") in ("instagram","x","reddit")]
-    text = " ".join(texts).lower()
-    text = re.sub(r"http\S+|[@#]\w+|\d+"," ",text)
-    toks = [t for t in re.findall(r"[a-z][a-z'\-]+", text) if len(t)>=min_len]
-    stop = set(("the a an and or for with this that about from into over under your our their you we they of in on at to is are be was were been being will would can could should it its it's im i'm".split()))
-    toks = [t for t in toks if t not in stop]
-    grams=[]
-    for n in (1,2,3):
-        grams.extend(" ".join(toks[i:i+n]) for i in range(len(toks)-n+1))
-    cnt = Counter(grams)
+    cnt = Counter()
+    for r in rows:
+        if r.get("platform") not in ("instagram","x","reddit"):
+            continue
+        text = _STRIP.sub(" ",(r.get("text") or "").lower())
+        toks = [t for t in _TOK.findall(text) if len(t)>=min_len and t not in STOP]
+        # n-grams are built per post so they never span two posts
+        cnt.update(toks)
+        cnt.update(map(" ".join, zip(toks, toks[1:])))
+        cnt.update(map(" ".join, zip(toks, toks[1:], toks[2:])))
     return [{"term":t,"count":c} for t,c in cnt.most_common(top_k)]
 
-def representative_sample(rows, n_per_platform=60):
-    """Guarantee representation from each platform."""
+def group_by_platform(rows):
+    """Bucket rows by platform in a single pass."""
     by_platform = defaultdict(list)
     for r in rows:
         by_platform[r.get("platform")].append(r)
+    return by_platform
+
+def representative_sample(by_platform, n_per_platform=60):
+    """Guarantee representation from each platform (takes group_by_platform output)."""
     sample = []
     for p, items in by_platform.items():
-        sorted_items = sorted(items, key=lambda r: r.get("score",0), reverse=True)
-        sample.extend(sorted_items[:n_per_platform])
+        sample.extend(heapq.nlargest(n_per_platform, items, key=lambda r: r.get("score",0)))
     return sample
 
 if __name__ == "__main__":
-    rows = prepare(load_all())
+    # Stream raw rows straight through dedup; only cleaned rows are ever materialised
+    rows = list(prepare(load_all()))
     rows = trend_score(rows)
 
+    by_platform = group_by_platform(rows)
+
     # Balanced representation
-    balanced = representative_sample(rows, n_per_platform=60)
+    balanced = representative_sample(by_platform, n_per_platform=60)
 
     ctx = {
         "summary": {
             "total_items": len(rows),
-            "by_platform": {p: sum(1 for r in rows if r["platform"]==p) for p in set(r["platform"] for r in rows)}
+            "by_platform": {p: len(items) for p, items in by_platform.items()}
         },
         "top_posts": balanced,
         "slang_candidates": ngram_slang(rows),
-        "reddit_posts": [r for r in rows if r.get("platform")=="reddit"],
-        "news_articles": [r for r in rows if r.get("platform")=="news"],
+        "reddit_posts": by_platform.get("reddit", []),
+        "news_articles": by_platform.get("news", []),
     }
 
     out_path = OUTDIR / "context.json"
+    # Compact JSON: it is only ever machine-read and embedded in the LLM prompt
     with open(out_path, "wb") as f:
-        f.write(orjson.dumps(ctx, option=orjson.OPT_INDENT_2))
+        f.write(orjson.dumps(ctx))
     print(f"Wrote {out_path} with {len(balanced)} representative posts.")
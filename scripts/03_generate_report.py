@@ -2,11 +2,19 @@
 # Generate a weekly brief Markdown file from data/context/context.json using OpenAI.
 
 import os
+import hashlib
+import inspect
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 import orjson
 from dotenv import load_dotenv
 
+from fileops import link_or_copy
+
 load_dotenv()
 
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
@@ -14,6 +22,19 @@ MODEL = os.getenv("OPENAI_MODEL", "gpt-5-mini")  # set to a model your key has
 ROOT = Path(__file__).resolve().parents[1]
 CTX_PATH = ROOT / "data" / "context" / "context.json"
 RUN_ID = os.getenv("RUN_ID")
+LLM_CACHE = os.getenv("LLM_CACHE", "0") == "1"  # reuse the brief when the prompt is unchanged
+LLM_CACHE_DIR = ROOT / "data" / "cache" / "llm"
+# Routes requests sharing the same instruction prefix to the same provider cache shard
+PROMPT_CACHE_KEY = "weekly_brief_v1"
+OPENAI_BATCH = os.getenv("OPENAI_BATCH", "0") == "1"  # submit via the Batch API (cheaper, not interactive)
+BATCH_DIR = ROOT / "data" / "cache" / "batch"
+BATCH_POLL_SECONDS = 30
+# Opt-in: generate each report section in its own concurrent request and join them in order
+REPORT_PARALLEL_SECTIONS = os.getenv("REPORT_PARALLEL_SECTIONS", "0") == "1"
+SECTION_WORKERS = int(os.getenv("REPORT_SECTION_WORKERS", "5"))
+SECTION_MAX_OUT_TOKENS = 3000
+# The SDK retries 408/409/429/5xx, timeouts and connection errors with exponential backoff
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
 
 def resolve_output_dir() -> Path:
     """Return the output directory for the current run (defaulting to shared outputs)."""
@@ -35,74 +56,170 @@ SYSTEM_PROMPT = (
     "Avoid health claims and ‘sober shaming’. Use only the supplied context."
 )
 
-USER_PROMPT = """You are given structured context JSON (summary, top_posts, slang_candidates, reddit_posts, news_articles).
-
-Produce a well-structured weekly report with these sections:
-
-# Headline Summary (2 short paragraphs)
-- What’s moving and why, in plain language. Name the biggest patterns.
+REPORT_INTRO = "You are given structured context JSON (summary, top_posts, slang_candidates, reddit_posts, news_articles)."
 
-## Top Trends (8 items)
+# (key, spec) in report order; USER_PROMPT lists them all, parallel mode asks for one per call
+SECTIONS = [
+    ("headline", """# Headline Summary (2 short paragraphs)
+- What’s moving and why, in plain language. Name the biggest patterns."""),
+    ("trends", """## Top Trends (8 items)
 For each:
 - Title (friendly, descriptive)
 - Why it matters (2–3 sentences; cite cross-platform presence or creator weight)
-- 2–3 example links
-
-## Slang & Phrases to Watch (10 items)
-- Term — one-line gloss; add an example URL if present.
-
-## Content Plan (5 themes)
+- 2–3 example links"""),
+    ("slang", """## Slang & Phrases to Watch (10 items)
+- Term — one-line gloss; add an example URL if present."""),
+    ("content_plan", """## Content Plan (5 themes)
 For each theme:
 - Rationale (2–3 sentences, grounded in the posts)
 - Hook (10–12 words)
 - Two formats (e.g., Reel, Carousel, TikTok) each with 3–6 beat bullets
 - On-screen text (one line) + Caption (one sentence)
 - 3–5 hashtags (blend brand + trend; UK English)
-- Compliance notes (brief)
+- Compliance notes (brief)"""),
+    ("notables", """## Notables
+- Product launches or notable creator posts (bulleted with links)."""),
+]
 
-## Notables
-- Product launches or notable creator posts (bulleted with links).
+REPORT_TONE = "Tone: friendly, helpful, confident. Avoid clipped telegraph style."
 
-Tone: friendly, helpful, confident. Avoid clipped telegraph style."""
+USER_PROMPT = (
+    f"{REPORT_INTRO}\n\nProduce a well-structured weekly report with these sections:\n\n"
+    + "\n\n".join(spec for _, spec in SECTIONS)
+    + f"\n\n{REPORT_TONE}"
+)
+
+# Fields the prompt actually draws on; everything else in context.json is dropped
+SLIM_POST_FIELDS = ("platform", "author", "url", "title", "text", "score", "term", "value")
+SLIM_TEXT_CHARS = 400
+SLIM_MAX_POSTS = 60  # per reddit_posts / news_articles list
+
+def _slim_post(post: dict) -> dict:
+    slim = {k: post.get(k) for k in SLIM_POST_FIELDS}
+    if slim["text"]:
+        slim["text"] = slim["text"][:SLIM_TEXT_CHARS]
+    return {k: v for k, v in slim.items() if v not in (None, "", [])}
+
+def _slim_context(ctx: dict) -> dict:
+    """Trim the context to what the brief needs before it is serialised into the prompt."""
+    return {
+        "summary": ctx.get("summary", {}),
+        # already balanced per platform by 02_prepare_context.py, so keep it whole
+        "top_posts": [_slim_post(p) for p in ctx.get("top_posts", [])],
+        "slang_candidates": ctx.get("slang_candidates", []),
+        "reddit_posts": [_slim_post(p) for p in ctx.get("reddit_posts", [])[:SLIM_MAX_POSTS]],
+        "news_articles": [_slim_post(p) for p in ctx.get("news_articles", [])[:SLIM_MAX_POSTS]],
+    }
 
 def load_context():
     if not CTX_PATH.exists():
         raise FileNotFoundError(f"Context not found: {CTX_PATH}. Run scripts/02_prepare_context.py first.")
-    return orjson.loads(CTX_PATH.read_bytes())
+    with CTX_PATH.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return orjson.loads(f.read())  # mmap can't map an empty file; let orjson report it
+        # parse straight from the page cache instead of copying the file into a bytes object first
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
+def llm_cache_path(
+    system_text: str, user_text: str, context_json: dict, max_out_tokens: int, task: Optional[str] = None
+) -> Path:
+    """Exact-match cache file keyed on everything that determines the model's input."""
+    parts = [MODEL, system_text, user_text, context_json, max_out_tokens]
+    if task:
+        parts.append(task)
+    key = hashlib.blake2b(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return LLM_CACHE_DIR / f"{key}.md"
+
+def call_openai(
+    system_text: str, user_text: str, context_json: dict, max_out_tokens=6000, task: Optional[str] = None
+) -> str:
+    generate = _call_openai_batch if OPENAI_BATCH else _call_openai
+    if LLM_CACHE:
+        cache_path = llm_cache_path(system_text, user_text, context_json, max_out_tokens, task)
+        if cache_path.exists():
+            print(f"Using cached response -> {cache_path}")
+            return cache_path.read_text(encoding="utf-8")
+        text = generate(system_text, user_text, context_json, max_out_tokens, task)
+        if text:
+            LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_suffix(".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, cache_path)
+        return text
+    return generate(system_text, user_text, context_json, max_out_tokens, task)
+
+def section_task(spec: str) -> str:
+    heading = spec.splitlines()[0].split(" (")[0]  # "## Top Trends (8 items)" -> "## Top Trends"
+    return (
+        f"Write only the “{heading.lstrip('# ')}” section of the report now, following its "
+        f"specification above. Start with the line `{heading}` and output nothing after the section."
+    )
+
+def generate_report(context_json: dict) -> str:
+    """
+    The weekly brief as Markdown. With REPORT_PARALLEL_SECTIONS=1 each section is its own
+    request (same system prefix + context, so they share the prompt cache) and the
+    results are joined in SECTIONS order; batch mode always uses the single request.
+    """
+    if not REPORT_PARALLEL_SECTIONS or OPENAI_BATCH:
+        return call_openai(SYSTEM_PROMPT, USER_PROMPT, context_json, max_out_tokens=6000)
+
+    def one(section):
+        _, spec = section
+        return call_openai(
+            SYSTEM_PROMPT, USER_PROMPT, context_json, SECTION_MAX_OUT_TOKENS, section_task(spec)
+        ).strip()
+
+    with ThreadPoolExecutor(max_workers=SECTION_WORKERS) as pool:
+        return "\n\n".join(pool.map(one, SECTIONS)) + "\n"
+
+def build_messages(system_text: str, user_text: str, context_json: dict, task: Optional[str] = None) -> list:
+    """
+    Stable instructions first, volatile context last: one merged system message forms
+    an identical prefix across runs, so the provider's prompt cache can skip its prefill.
+    A per-call 'task' goes after the context so it doesn't break that shared prefix.
+    """
+    # Assemble the fence around the bytes and decode once, instead of decoding and
+    # then copying the whole context again through an f-string
+    ctx_msg = (b"Context JSON:\n```json\n" + orjson.dumps(context_json) + b"\n```").decode("utf-8")
+    messages = [
+        {"role": "system", "content": f"{system_text}\n\n{user_text}"},
+        {"role": "user", "content": ctx_msg},
+    ]
+    if task:
+        messages.append({"role": "user", "content": task})
+    return messages
 
-def call_openai(system_text: str, user_text: str, context_json: dict, max_out_tokens=6000) -> str:
+@lru_cache(maxsize=None)
+def _responses_token_kw() -> str:
+    """Name of the output-token cap accepted by this SDK's responses.create (checked once)."""
+    from openai.resources.responses import Responses
+
+    params = inspect.signature(Responses.create).parameters
+    return "max_output_tokens" if "max_output_tokens" in params else "max_completion_tokens"
+
+def _call_openai(
+    system_text: str, user_text: str, context_json: dict, max_out_tokens=6000, task: Optional[str] = None
+) -> str:
     if not OPENAI_KEY:
         raise RuntimeError("OPENAI_API_KEY is not set in .env")
 
     from openai import OpenAI
     from openai import BadRequestError
 
-    client = OpenAI(api_key=OPENAI_KEY)
-    ctx_str = orjson.dumps(context_json).decode("utf-8")
-    messages = [
-        {"role": "system", "content": system_text},
-        {"role": "user", "content": user_text},
-        {"role": "user", "content": f"Context JSON:\n```json\n{ctx_str}\n```"},
-    ]
+    client = OpenAI(api_key=OPENAI_KEY, max_retries=OPENAI_MAX_RETRIES)
+    messages = build_messages(system_text, user_text, context_json, task)
 
-    # Prefer Responses API (GPT-5 family). Try max_output_tokens then max_completion_tokens.
+    # Prefer Responses API (GPT-5 family), with whichever token-cap kwarg the SDK takes.
     try:
         resp = client.responses.create(
             model=MODEL,
             input=messages,
-            max_output_tokens=max_out_tokens,
+            extra_body={"prompt_cache_key": PROMPT_CACHE_KEY},
+            **{_responses_token_kw(): max_out_tokens},
         )
         return resp.output_text
-    except TypeError:
-        try:
-            resp = client.responses.create(
-                model=MODEL,
-                input=messages,
-                max_completion_tokens=max_out_tokens,
-            )
-            return resp.output_text
-        except Exception:
-            pass
     except BadRequestError as e:
         if "must use the chat.completions endpoint" not in str(e):
             raise
@@ -125,27 +242,101 @@ def call_openai(system_text: str, user_text: str, context_json: dict, max_out_to
     )
     return resp.choices[0].message.content
 
+def _call_openai_batch(
+    system_text: str, user_text: str, context_json: dict, max_out_tokens=6000, task: Optional[str] = None
+) -> str:
+    """Submit the request through the Batch API (about half the price, up to 24h) and wait for it."""
+    if not OPENAI_KEY:
+        raise RuntimeError("OPENAI_API_KEY is not set in .env")
+
+    import time
+    from openai import OpenAI
+
+    client = OpenAI(api_key=OPENAI_KEY, max_retries=OPENAI_MAX_RETRIES)
+    request = {
+        "custom_id": "weekly_brief",
+        "method": "POST",
+        "url": "/v1/responses",
+        "body": {
+            "model": MODEL,
+            "input": build_messages(system_text, user_text, context_json, task),
+            "max_output_tokens": max_out_tokens,
+            "prompt_cache_key": PROMPT_CACHE_KEY,
+        },
+    }
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    in_path = BATCH_DIR / "in.jsonl"
+    in_path.write_bytes(orjson.dumps(request, option=orjson.OPT_APPEND_NEWLINE))
+    with open(in_path, "rb") as fh:
+        batch_file = client.files.create(file=fh, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/responses",
+        completion_window="24h",
+    )
+    print(f"Submitted batch {batch.id}; polling every {BATCH_POLL_SECONDS}s")
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = client.batches.retrieve(batch.id)
+        print(f"Batch {batch.id}: {batch.status}")
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+    if not batch.output_file_id:
+        detail = client.files.content(batch.error_file_id).text if batch.error_file_id else ""
+        raise RuntimeError(f"Batch {batch.id} produced no output: {detail.strip()}")
+
+    result = orjson.loads(client.files.content(batch.output_file_id).text.splitlines()[0])
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        raise RuntimeError(f"Batch request failed: {result.get('error') or response.get('body')}")
+    body = response["body"]
+    return "".join(
+        part.get("text", "")
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for part in item.get("content", [])
+        if part.get("type") == "output_text"
+    )
+
 def save_markdown(text: str, path: Path):
     path.write_text(text, encoding="utf-8")
 
 
-def write_latest_copy(text: str, out_dir: Path, latest_dir: Path, filename: str):
+def write_latest_copy(src: Path, out_dir: Path, latest_dir: Path, filename: str):
     """Update convenience copies in the run directory and shared latest directory."""
-    latest_path = out_dir / filename
-    latest_path.write_text(text, encoding="utf-8")
-    shared_latest = latest_dir / filename
-    shared_latest.write_text(text, encoding="utf-8")
+    link_or_copy(src, out_dir / filename)
+    link_or_copy(src, latest_dir / filename)
+
+@lru_cache(maxsize=None)
+def load_docx_converter():
+    """Import scripts/04_markdown_to_docx.py in-process (its file name isn't importable as-is)."""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(
+        "markdown_to_docx", Path(__file__).with_name("04_markdown_to_docx.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
 def main():
-    ctx = load_context()
-    md = call_openai(SYSTEM_PROMPT, USER_PROMPT, ctx, max_out_tokens=6000)
+    ctx = _slim_context(load_context())
+    md = generate_report(ctx)
     timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     md_filename = f"weekly_brief_{timestamp}.md"
     md_path = OUT_DIR / md_filename
     save_markdown(md, md_path)
-    write_latest_copy(md, OUT_DIR, LATEST_DIR, "weekly_brief.md")
+    write_latest_copy(md_path, OUT_DIR, LATEST_DIR, "weekly_brief.md")
     print(f"Wrote markdown -> {md_path}")
-    print("Next: run scripts/04_markdown_to_docx.py to create the DOCX.")
+    if RUN_ID:
+        # Convert straight from memory rather than re-reading the file in a second process
+        converter = load_docx_converter()
+        docx_path = md_path.with_suffix(".docx")
+        converter.md_to_docx(md.splitlines()).save(docx_path)
+        converter.write_latest_docx(docx_path, OUT_DIR, LATEST_DIR)
+        print(f"Wrote DOCX -> {docx_path}")
+    else:
+        print("Next: run scripts/04_markdown_to_docx.py to create the DOCX.")
 
 if __name__ == "__main__":
     main()
@@ -5,16 +5,20 @@
 # - Basic bullets / numbered lists
 
 import argparse
+import io
 import os
 import re
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+from xml.sax.saxutils import escape
 from docx import Document
 from docx.shared import Pt
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
 from docx.opc.constants import RELATIONSHIP_TYPE
 
+from fileops import link_or_copy
+
 ROOT = Path(__file__).resolve().parents[1]
 RUN_ID = os.getenv("RUN_ID")
 
@@ -32,7 +36,13 @@ OUT_DIR = resolve_output_dir()
 LATEST_DIR = ROOT / "data" / "latest"
 LATEST_DIR.mkdir(parents=True, exist_ok=True)
 
+# Blank document with style_document() already applied; regenerate with --write-template
+TEMPLATE_PATH = Path(__file__).resolve().with_name("template.docx")
+
 URL_RE = re.compile(r"(https?://[^\s)]+)")
+# One match per line: optional heading / bullet / numbered marker, then the content
+LINE_RE = re.compile(r"^(?:(?P<h>#{1,3}) |(?P<b>\s*- )|(?P<n>\s*\d+\.\s))?(?P<rest>.*)$")
+RUN_SPLIT_RE = re.compile(r"([\t\r\n])")
 
 
 def normalize_path(path: Path) -> Path:
@@ -44,6 +54,11 @@ def parse_args():
     parser = argparse.ArgumentParser(description="Convert weekly brief markdown to DOCX")
     parser.add_argument("--md", type=Path, help="Path to markdown file to convert")
     parser.add_argument("--docx", type=Path, help="Optional explicit DOCX output path")
+    parser.add_argument(
+        "--write-template",
+        action="store_true",
+        help=f"Rebuild {TEMPLATE_PATH.name} from style_document() and exit",
+    )
     return parser.parse_args()
 
 
@@ -79,11 +94,8 @@ def resolve_docx_path(md_path: Path, explicit: Optional[Path]) -> Path:
 
 
 def write_latest_docx(doc_path: Path, out_dir: Path, latest_dir: Path):
-    data = doc_path.read_bytes()
-    latest_path = out_dir / "weekly_brief.docx"
-    latest_path.write_bytes(data)
-    shared_latest = latest_dir / "weekly_brief.docx"
-    shared_latest.write_bytes(data)
+    link_or_copy(doc_path, out_dir / "weekly_brief.docx")
+    link_or_copy(doc_path, latest_dir / "weekly_brief.docx")
 
 def style_document(doc: Document):
     # Base text
@@ -116,125 +128,155 @@ def style_document(doc: Document):
     h3.paragraph_format.space_before = Pt(6)
     h3.paragraph_format.space_after = Pt(4)
 
-def add_hyperlink(paragraph, url: str, text: str = None):
+def new_document() -> Document:
+    """Blank, pre-styled document: the shipped template, or a freshly styled default if it's missing."""
+    if TEMPLATE_PATH.exists():
+        return Document(str(TEMPLATE_PATH))
+    doc = Document()
+    style_document(doc)
+    return doc
+
+def write_template(path: Path = TEMPLATE_PATH):
+    doc = Document()
+    style_document(doc)
+    doc.save(path)
+
+def hyperlink_xml(part, url: str, text: str = None, url_cache: Optional[dict] = None) -> str:
     """
-    Insert a clickable external hyperlink into 'paragraph'.
+    OOXML for a clickable external hyperlink (blue + underline + no-proof run).
     This does NOT depend on the 'Hyperlink' character style being present.
+    Pass a shared 'url_cache' dict to reuse one relationship id per distinct URL.
     """
     if text is None:
         text = url
 
-    # 1) create relationship id to the external target
-    part = paragraph.part
-    r_id = part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
-
-    # 2) build the w:hyperlink wrapper with r:id
-    hyperlink = OxmlElement("w:hyperlink")
-    hyperlink.set(qn("r:id"), r_id)
-
-    # 3) create a run with formatting (blue + underline)
-    r = OxmlElement("w:r")
-    r_pr = OxmlElement("w:rPr")
-
-    # underline
-    u = OxmlElement("w:u")
-    u.set(qn("w:val"), "single")
-    r_pr.append(u)
-
-    # blue colour
-    color = OxmlElement("w:color")
-    color.set(qn("w:val"), "0000FF")
-    r_pr.append(color)
-
-    # (optional) no-proof to suppress spellcheck
-    no_proof = OxmlElement("w:noProof")
-    r_pr.append(no_proof)
-
-    r.append(r_pr)
-
-    # 4) text node
-    t = OxmlElement("w:t")
-    t.text = text
-    r.append(t)
+    # create (or reuse) the relationship id to the external target;
+    # relate_to scans every existing relationship, so skip it for URLs seen before
+    r_id = url_cache.get(url) if url_cache is not None else None
+    if r_id is None:
+        r_id = part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+        if url_cache is not None:
+            url_cache[url] = r_id
+
+    return (
+        f'<w:hyperlink r:id="{r_id}"><w:r>'
+        '<w:rPr><w:u w:val="single"/><w:color w:val="0000FF"/><w:noProof/></w:rPr>'
+        f"{_t_xml(text)}</w:r></w:hyperlink>"
+    )
 
-    # 5) append run to hyperlink, then hyperlink to paragraph
-    hyperlink.append(r)
-    paragraph._p.append(hyperlink)
+def _t_xml(text: str) -> str:
+    space = ' xml:space="preserve"' if len(text.strip()) < len(text) else ""
+    return f"<w:t{space}>{escape(text)}</w:t>"
 
-def add_text_with_links(paragraph, text: str):
+def run_xml(text: str) -> str:
+    """OOXML for a plain run, matching python-docx's add_run (tabs / line breaks as elements)."""
+    parts = []
+    for piece in RUN_SPLIT_RE.split(text):
+        if not piece:
+            continue
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\r", "\n"):
+            parts.append("<w:br/>")
+        else:
+            parts.append(_t_xml(piece))
+    return f"<w:r>{''.join(parts)}</w:r>"
+
+def text_with_links_xml(part, text: str, url_cache: Optional[dict] = None) -> str:
     """
-    Append text to a paragraph, converting URLs into clickable hyperlinks.
+    Runs for 'text', converting URLs into clickable hyperlinks.
     """
+    # most lines carry no link at all; skip the regex scan and slicing for them
+    if "http" not in text:
+        return run_xml(text) if text else ""
+    out = []
     pos = 0
     for m in URL_RE.finditer(text):
         before = text[pos:m.start()]
         if before:
-            paragraph.add_run(before)
+            out.append(run_xml(before))
         url = m.group(1)
-        add_hyperlink(paragraph, url, url)
+        out.append(hyperlink_xml(part, url, url, url_cache))
         pos = m.end()
     tail = text[pos:]
     if tail:
-        paragraph.add_run(tail)
+        out.append(run_xml(tail))
+    return "".join(out)
 
-def add_paragraph_with_links(doc: Document, text: str, style: str = None):
-    p = doc.add_paragraph(style=style) if style else doc.add_paragraph()
-    add_text_with_links(p, text)
-    return p
+def paragraph_xml(inner: str = "", style_id: Optional[str] = None) -> str:
+    ppr = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ""
+    return f"<w:p>{ppr}{inner}</w:p>"
 
-def is_numbered(line: str) -> bool:
-    # e.g., "1. Something", "12. Item"
-    return re.match(r"^\s*\d+\.\s", line) is not None
+def md_to_docx(md_lines: Iterable[str]) -> Document:
+    """
+    Build the document body as one OOXML string and parse it in a single lxml call,
+    rather than minting and appending elements paragraph by paragraph.
+    'md_lines' is any iterable of lines (an open file, or str.splitlines()).
+    """
+    doc = new_document()
+    part = doc.part
 
-def md_to_docx(md_text: str) -> Document:
-    doc = Document()
-    style_document(doc)
+    # resolve style ids once rather than on every matching line
+    heading_ids = {level: doc.styles[f"Heading {level}"].style_id for level in (1, 2, 3)}
+    bullet_id = doc.styles["List Bullet"].style_id
+    number_id = doc.styles["List Number"].style_id
+    url_cache = {}  # url -> relationship id, shared by every hyperlink in the document
 
-    bullet_mode = False
-    for raw in md_text.splitlines():
+    buf = io.StringIO()
+    for raw in md_lines:
         line = raw.rstrip()
 
         # Blank line → paragraph break
         if not line.strip():
-            bullet_mode = False
-            doc.add_paragraph("")
+            buf.write(paragraph_xml())
             continue
 
-        # Headings
-        if line.startswith("# "):
-            doc.add_heading(line[2:].strip(), level=1); bullet_mode = False; continue
-        if line.startswith("## "):
-            doc.add_heading(line[3:].strip(), level=2); bullet_mode = False; continue
-        if line.startswith("### "):
-            doc.add_heading(line[4:].strip(), level=3); bullet_mode = False; continue
+        m = LINE_RE.match(line)
+        content = m.group("rest").strip()
+
+        # Headings ("# ", "## ", "### ")
+        if m.group("h"):
+            buf.write(paragraph_xml(run_xml(content) if content else "", heading_ids[len(m.group("h"))]))
+            continue
 
         # Bullets
-        if line.lstrip().startswith("- "):
-            if not bullet_mode:
-                bullet_mode = True
-            p = doc.add_paragraph(style=doc.styles["List Bullet"])
-            add_text_with_links(p, line.lstrip()[2:].strip())
+        if m.group("b"):
+            buf.write(paragraph_xml(text_with_links_xml(part, content, url_cache), bullet_id))
             continue
 
-        # Numbered
-        if is_numbered(line):
-            content = re.sub(r"^\s*\d+\.\s", "", line).strip()
-            p = doc.add_paragraph(style=doc.styles["List Number"])
-            add_text_with_links(p, content)
+        # Numbered (e.g., "1. Something", "12. Item")
+        if m.group("n"):
+            buf.write(paragraph_xml(text_with_links_xml(part, content, url_cache), number_id))
             continue
 
         # Normal paragraph
-        bullet_mode = False
-        add_paragraph_with_links(doc, line)
+        buf.write(paragraph_xml(text_with_links_xml(part, line, url_cache)))
+
+    # attach everything ahead of the trailing section properties, as add_paragraph does
+    fragment = parse_xml(f'<w:body {nsdecls("w", "r")}>{buf.getvalue()}</w:body>')
+    body = doc.element.body
+    sect_pr = body.sectPr
+    for p in list(fragment):
+        if sect_pr is not None:
+            sect_pr.addprevious(p)
+        else:
+            body.append(p)
 
     return doc
 
 if __name__ == "__main__":
     args = parse_args()
+    if args.write_template:
+        write_template()
+        print(f"Wrote template -> {TEMPLATE_PATH}")
+        raise SystemExit(0)
     md_path = discover_markdown(OUT_DIR, args.md)
-    md_text = md_path.read_text(encoding="utf-8")
-    doc = md_to_docx(md_text)
+    with md_path.open("r", encoding="utf-8") as f:
+        # re-split each chunk so \f, \v, \x85, \u2028 ... still break lines as str.splitlines() does
+        doc = md_to_docx(line for chunk in f for line in chunk.splitlines())
     docx_path = resolve_docx_path(md_path, args.docx)
+    # the target may be a hardlinked "latest" view; unlink so saving doesn't rewrite its siblings
+    docx_path.unlink(missing_ok=True)
     doc.save(docx_path)
     write_latest_docx(docx_path, OUT_DIR, LATEST_DIR)
     print(f"Wrote DOCX -> {docx_path}")
@@ -0,0 +1,20 @@
+# scripts/fileops.py
+# Small file helpers shared by the pipeline scripts.
+
+import os
+import shutil
+from pathlib import Path
+
+
+def link_or_copy(src: Path, dst: Path):
+    """Point dst at src's bytes: a hardlink when possible, a copy across filesystems."""
+    if dst.exists() and os.path.samefile(src, dst):
+        return
+    tmp = dst.with_name(dst.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    # swap in atomically so readers never see a missing or half-written file
+    os.replace(tmp, dst)
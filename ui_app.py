@@ -5,14 +5,21 @@
 # - Streams logs from each step
 # - Optional: uploads weekly_brief.docx to Google Drive as a Google Doc (service account)
 
+import io
 import os
 import sys
+import mmap
 import time
+import codecs
+import shutil
+import hashlib
 import subprocess
+from collections import deque
 from pathlib import Path
 
 import streamlit as st
-from dotenv import load_dotenv, set_key, find_dotenv
+from dotenv import load_dotenv, find_dotenv
+from dotenv.parser import parse_stream
 
 # ---------- Paths / env loading ----------
 
@@ -24,6 +31,8 @@ LATEST_DIR = ROOT / "data" / "latest"
 LATEST_DIR.mkdir(parents=True, exist_ok=True)
 DEFAULT_CONFIG_DIR = ROOT / "config"
 SELECTED_CONFIG_DIR = str(DEFAULT_CONFIG_DIR)
+PIPE_READ_SIZE = 1 << 16  # max bytes taken from a step's stdout per wakeup
+DRIVE_CHUNK_SIZE = 10 * 1024 * 1024  # resumable upload chunk; must be a multiple of 256 KiB
 
 ENV_PATH = ROOT / ".env"
 if ENV_PATH.exists():
@@ -42,12 +51,64 @@ def mask(v: str) -> str:
         return "*" * len(v)
     return v[:4] + "*" * (len(v) - 8) + v[-4:]
 
+def _env_line(key: str, value: str) -> str:
+    # same single-quoted form as dotenv.set_key, escaped so it round-trips through load_dotenv
+    escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+    return f"{key}='{escaped}'\n"
+
+def save_env(path: Path, values: dict):
+    """Set several keys in a .env with one read and one atomic write; other lines are kept verbatim."""
+    out = []
+    written = set()
+    if path.exists():
+        with path.open(encoding="utf-8") as f:
+            for mapping in parse_stream(f):
+                if mapping.key in values:
+                    if mapping.key not in written:  # a repeated key collapses to one line
+                        out.append(_env_line(mapping.key, values[mapping.key]))
+                        written.add(mapping.key)
+                else:
+                    out.append(mapping.original.string)
+    if out and not out[-1].endswith("\n"):
+        out[-1] += "\n"
+    out.extend(_env_line(k, v) for k, v in values.items() if k not in written)
+
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text("".join(out), encoding="utf-8")
+    if path.exists():
+        shutil.copymode(path, tmp)
+    os.replace(tmp, path)
+
+def read_line_batches(pipe):
+    """
+    Yield lists of complete lines from a binary pipe. Each os.read returns whatever the
+    child has written so far (up to PIPE_READ_SIZE), so a burst of output arrives as one
+    batch instead of one wakeup per line. Decoding matches text mode: UTF-8, universal newlines.
+    """
+    fd = pipe.fileno()
+    utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    decoder = io.IncrementalNewlineDecoder(utf8, translate=True)
+    pending = ""
+    while True:
+        chunk = os.read(fd, PIPE_READ_SIZE)
+        if not chunk:
+            break
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        if lines:
+            yield [line.rstrip() for line in lines]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending.rstrip()]
+
 def run_script(script_relpath: str, args=None, env_extra=None):
-    """Run a Python script and stream stdout/stderr lines to the UI."""
-    env = os.environ.copy()
-    env["CONFIG_DIR"] = SELECTED_CONFIG_DIR
-    if env_extra:
-        env.update(env_extra)
+    """
+    Run a Python script and stream batches of stdout/stderr lines to the UI.
+    Steps stay in a child interpreter on purpose: they bind RUN_ID / CONFIG_DIR and their
+    output dirs at import time, report through print(), and may exit the process, so running
+    them in the Streamlit server would mean re-importing per run and mutating shared os.environ.
+    """
+    # Built fresh per launch (a cached snapshot would miss Save & Apply), in a single dict build
+    env = {**os.environ, "CONFIG_DIR": SELECTED_CONFIG_DIR, **(env_extra or {})}
 
     cmd = [sys.executable, str(SCRIPTS / script_relpath)]
     if args:
@@ -57,26 +118,54 @@ def run_script(script_relpath: str, args=None, env_extra=None):
         cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
-        text=True,
-        encoding="utf-8",
         env=env,
     )
-    for line in iter(process.stdout.readline, ""):
-        yield line.rstrip()
+    yield from read_line_batches(process.stdout)
     process.stdout.close()
     rc = process.wait()
     if rc != 0:
         raise RuntimeError(f"{script_relpath} failed with exit code {rc}")
 
-def list_runs():
+# Streamlit reruns the whole script on every interaction; these listings are keyed on
+# the directory mtime (changes whenever an entry is added/replaced), so a rerun costs one stat
+@st.cache_data(ttl=5, show_spinner=False)
+def _list_runs(root_mtime_ns: int):
     return sorted([p.name for p in RUNS_ROOT.iterdir() if p.is_dir()])
 
+def list_runs():
+    return _list_runs(RUNS_ROOT.stat().st_mtime_ns)
+
+@st.cache_data(ttl=5, show_spinner=False)
+def _latest_output(out_dir: str, name: str, dir_mtime_ns: int):
+    p = Path(out_dir) / name
+    return p if p.exists() else None
+
 def latest_output(run_id: str, name: str):
     out_dir = RUNS_ROOT / run_id / "outputs"
-    if not out_dir.exists():
+    try:
+        dir_mtime_ns = out_dir.stat().st_mtime_ns
+    except FileNotFoundError:
         return None
-    p = out_dir / name
-    return p if p.exists() else None
+    return _latest_output(str(out_dir), name, dir_mtime_ns)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    """Content hash, recomputed only when the file's mtime/size change; hashed from an mmap, not a copy."""
+    h = hashlib.blake2b(digest_size=16)
+    if size:  # mmap can't map an empty file
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(mm)
+    return h.hexdigest()
+
+# cache_resource hands back the same immutable bytes object (cache_data would unpickle a
+# fresh copy per rerun); keyed on content, so a rewritten-but-identical brief isn't re-read
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _file_bytes(digest: str, _path: str) -> bytes:
+    return Path(_path).read_bytes()
+
+def file_bytes(p: Path) -> bytes:
+    stat = p.stat()
+    return _file_bytes(_file_digest(str(p), stat.st_mtime_ns, stat.st_size), str(p))
 
 
 def discover_config_dirs():
@@ -90,15 +179,28 @@ def discover_config_dirs():
         candidates.insert(0, DEFAULT_CONFIG_DIR)
     return candidates
 
-def upload_docx_to_drive_as_gdoc(docx_path: Path, folder_id: str, service_account_file: str):
-    """Upload .docx and convert to Google Doc in Drive (returns file id + link)."""
+@st.cache_resource(show_spinner=False)
+def _drive_credentials(service_account_file: str, key_mtime: float):
+    """Service-account credentials, parsed once per key file; key_mtime makes a rotated key reload."""
     from google.oauth2 import service_account
+
+    scopes = ["https://www.googleapis.com/auth/drive.file"]
+    return service_account.Credentials.from_service_account_file(service_account_file, scopes=scopes)
+
+def _drive_client(service_account_file: str):
+    # A fresh service per upload: it owns an httplib2.Http, which isn't thread-safe, and
+    # Streamlit sessions run on separate threads. The discovery doc ships with the library.
     from googleapiclient.discovery import build
+
+    creds = _drive_credentials(service_account_file, os.path.getmtime(service_account_file))
+    return build("drive", "v3", credentials=creds, cache_discovery=False)
+
+def upload_docx_to_drive_as_gdoc(docx_path: Path, folder_id: str, service_account_file: str, on_progress=None):
+    """Upload .docx and convert to Google Doc in Drive (returns file id + link).
+    on_progress(fraction) is called after each uploaded chunk."""
     from googleapiclient.http import MediaFileUpload
 
-    scopes = ["https://www.googleapis.com/auth/drive.file"]
-    creds = service_account.Credentials.from_service_account_file(service_account_file, scopes=scopes)
-    drive = build("drive", "v3", credentials=creds, cache_discovery=False)
+    drive = _drive_client(service_account_file)
 
     file_metadata = {
         "name": docx_path.stem,
@@ -109,8 +211,15 @@ def upload_docx_to_drive_as_gdoc(docx_path: Path, folder_id: str, service_accoun
         str(docx_path),
         mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         resumable=True,
+        chunksize=DRIVE_CHUNK_SIZE,
     )
-    created = drive.files().create(body=file_metadata, media_body=media, fields="id, webViewLink").execute()
+    # One request per file: Drive's batch endpoint rejects media uploads, so extra files can't share it
+    request = drive.files().create(body=file_metadata, media_body=media, fields="id, webViewLink")
+    created = None
+    while created is None:
+        status, created = request.next_chunk()
+        if status and on_progress:
+            on_progress(status.progress())
     return created.get("id"), created.get("webViewLink")
 
 # ---------- UI ----------
@@ -130,22 +239,16 @@ with st.sidebar.form("env_form", clear_on_submit=False):
     drive_folder = st.text_input("GOOGLE_DRIVE_FOLDER_ID", os.getenv("GOOGLE_DRIVE_FOLDER_ID", ""))
     saved = st.form_submit_button("Save & Apply")
     if saved:
-        if not ENV_PATH.exists():
-            ENV_PATH.touch()
-        set_key(str(ENV_PATH), "APIFY_TOKEN", apify)
-        set_key(str(ENV_PATH), "OPENAI_API_KEY", openai_key)
-        set_key(str(ENV_PATH), "OPENAI_MODEL", openai_model)
-        set_key(str(ENV_PATH), "ENABLE_TRENDS", enable_trends)
-        set_key(str(ENV_PATH), "GOOGLE_SERVICE_ACCOUNT_FILE", sa_file)
-        set_key(str(ENV_PATH), "GOOGLE_DRIVE_FOLDER_ID", drive_folder)
-        os.environ.update({
+        new_env = {
             "APIFY_TOKEN": apify,
             "OPENAI_API_KEY": openai_key,
             "OPENAI_MODEL": openai_model,
             "ENABLE_TRENDS": enable_trends,
             "GOOGLE_SERVICE_ACCOUNT_FILE": sa_file,
             "GOOGLE_DRIVE_FOLDER_ID": drive_folder,
-        })
+        }
+        save_env(ENV_PATH, new_env)
+        os.environ.update(new_env)
         st.success("Saved to .env and applied to this session.")
 
 # Config selection
@@ -225,14 +328,22 @@ b_all = st.button("Run All")
 
 log = st.empty()
 prog = st.progress(0, text="Idle")
+LOG_LINES = 300
+LOG_FLUSH_SECONDS = 0.1  # re-send the log window at most ~10x/s however fast lines arrive
 
 def stream_task(name, gen, pct):
     prog.progress(pct, text=name)
-    buf = []
-    for line in gen:
-        buf.append(line)
-        if len(buf) > 300:
-            buf = buf[-300:]
+    buf = deque(maxlen=LOG_LINES)
+    last_flush = 0.0
+    try:
+        for lines in gen:
+            buf.extend(lines)
+            now = time.monotonic()
+            if now - last_flush >= LOG_FLUSH_SECONDS:
+                log.code("\n".join(buf))
+                last_flush = now
+    finally:
+        # always show the tail, including the lines leading up to a failure
         log.code("\n".join(buf))
     prog.progress(pct, text=f"{name} ✓")
 
@@ -243,16 +354,14 @@ def do_prepare(rid: str):
     stream_task(f"Prepare [{rid}]", run_script("02_prepare_context.py", env_extra={"RUN_ID": rid}), 66)
 
 def do_report(rid: str):
+    # With RUN_ID set, 03_generate_report.py also writes the DOCX in-process
     stream_task(
-        f"Report [{rid}] — markdown",
+        f"Report [{rid}] — markdown + docx",
         run_script("03_generate_report.py", env_extra={"RUN_ID": rid}),
-        90,
-    )
-    stream_task(
-        f"Report [{rid}] — docx",
-        run_script("04_markdown_to_docx.py", env_extra={"RUN_ID": rid}),
         98,
     )
+    _list_runs.clear()
+    _latest_output.clear()
 
 def maybe_upload(rid: str):
     docx = latest_output(rid, "weekly_brief.docx")
@@ -265,7 +374,12 @@ def maybe_upload(rid: str):
         st.info("Drive upload skipped (set GOOGLE_SERVICE_ACCOUNT_FILE and GOOGLE_DRIVE_FOLDER_ID).")
         return
     try:
-        file_id, link = upload_docx_to_drive_as_gdoc(docx, folder_id, sa_file)
+        file_id, link = upload_docx_to_drive_as_gdoc(
+            docx,
+            folder_id,
+            sa_file,
+            on_progress=lambda f: prog.progress(int(f * 100), text=f"Upload {int(f * 100)}%"),
+        )
         st.success(f"Uploaded to Drive as Google Doc: {link}")
     except Exception as e:
         st.error(f"Drive upload failed: {e}")
@@ -289,6 +403,9 @@ if b3:
     except Exception as e:
         st.error(str(e))
 if b_all:
+    # Strictly sequential: each step consumes the previous one's output, and every run
+    # shares data/raw + data/context, so separate RUN_IDs can't safely overlap either.
+    # The network-bound fan-out happens inside the steps (ingest sources, report sections).
     try:
         do_ingest(run_id)
         do_prepare(run_id)
@@ -303,6 +420,6 @@ st.write("### Latest outputs for active run")
 md = latest_output(run_id, "weekly_brief.md")
 docx = latest_output(run_id, "weekly_brief.docx")
 if md:
-    st.download_button("Download weekly_brief.md", md.read_bytes(), file_name=md.name, mime="text/markdown")
+    st.download_button("Download weekly_brief.md", file_bytes(md), file_name=md.name, mime="text/markdown")
 if docx:
-    st.download_button("Download weekly_brief.docx", docx.read_bytes(), file_name=docx.name, mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    st.download_button("Download weekly_brief.docx", file_bytes(docx), file_name=docx.name, mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")